@@ -1,13 +1,43 @@
 #!/usr/bin/env python3
-import requests
-import json
+import aiohttp
+import asyncio
+import orjson
+import random
 import time
 import argparse
-from typing import Dict, Any
+from typing import Dict, Any, List, AsyncIterator
 
 BASE_URL = "http://localhost:8000"
+URL_GENERATE = f"{BASE_URL}/generate-story"
 
-def generate_story(subject: str, topic: str, grade: str = "grade_6", curriculum: str = "General", specific_area: str = None) -> Dict[str, Any]:
+# Retry policy for idempotent GETs (mirrors urllib3's Retry(total=3, backoff_factor=0.5))
+RETRY_TOTAL = 3
+RETRY_BACKOFF_FACTOR = 0.5
+RETRY_STATUS_FORCELIST = (502, 503, 504)
+
+def create_session() -> aiohttp.ClientSession:
+    """
+    Create a shared HTTP session so connections are reused across polls
+    """
+    connector = aiohttp.TCPConnector(limit=100, limit_per_host=10, keepalive_timeout=30)
+    return aiohttp.ClientSession(connector=connector)
+
+async def get_json_with_retry(session: aiohttp.ClientSession, url: str) -> Dict[str, Any]:
+    """
+    GET a JSON resource, retrying connection errors and gateway errors with backoff
+    """
+    for attempt in range(RETRY_TOTAL + 1):
+        try:
+            async with session.get(url) as response:
+                if response.status not in RETRY_STATUS_FORCELIST or attempt == RETRY_TOTAL:
+                    response.raise_for_status()
+                    return await response.json(loads=orjson.loads)
+        except aiohttp.ClientConnectionError:
+            if attempt == RETRY_TOTAL:
+                raise
+        await asyncio.sleep(RETRY_BACKOFF_FACTOR * 2 ** attempt)
+
+async def generate_story(session: aiohttp.ClientSession, subject: str, topic: str, grade: str = "grade_6", curriculum: str = "General", specific_area: str = None) -> Dict[str, Any]:
     """
     Request a story generation from the API
     """
@@ -23,45 +53,91 @@ def generate_story(subject: str, topic: str, grade: str = "grade_6", curriculum:
     if specific_area:
         payload["specific_area"] = specific_area
         
-    # Send POST request to generate story
-    response = requests.post(f"{BASE_URL}/generate-story", json=payload)
-    response.raise_for_status()  # Raise exception for HTTP errors
-    
-    # Return the initial story data including the ID
-    return response.json()
+    # Send POST request to generate story with a pre-encoded body
+    body = orjson.dumps(payload)
+    headers = {"Content-Type": "application/json", "Content-Length": str(len(body))}
+    async with session.post(URL_GENERATE, data=body, headers=headers) as response:
+        response.raise_for_status()  # Raise exception for HTTP errors
+        
+        # Return the initial story data including the ID
+        return await response.json(loads=orjson.loads)
 
-def check_story_status(story_id: str) -> Dict[str, Any]:
+async def check_story_status(session: aiohttp.ClientSession, story_id: str) -> Dict[str, Any]:
     """
     Check the status of a story generation request
     """
-    response = requests.get(f"{BASE_URL}/story/{story_id}")
-    response.raise_for_status()
-    return response.json()
+    return await get_json_with_retry(session, f"{BASE_URL}/story/{story_id}")
 
-def wait_for_story_completion(story_id: str, polling_interval: int = 10, max_attempts: int = 30) -> Dict[str, Any]:
+async def wait_for_story_completion(session: aiohttp.ClientSession, story_id: str, polling_interval: float = 2, max_interval: float = 60, max_wait: float = 1800) -> Dict[str, Any]:
     """
-    Poll until story generation completes or fails
+    Poll until story generation completes or fails, backing off exponentially between checks
     """
+    deadline = time.monotonic() + max_wait
     attempts = 0
-    while attempts < max_attempts:
-        story_data = check_story_status(story_id)
-        status = story_data.get("status")
+    while time.monotonic() < deadline:
+        try:
+            story_data = await check_story_status(session, story_id)
+        except aiohttp.ClientError as e:
+            # Client errors (unknown or expired story ID, bad request) won't fix themselves
+            if isinstance(e, aiohttp.ClientResponseError) and e.status < 500 and e.status != 429:
+                raise
+            # Transient network/server error - back off and try again
+            print(f"⚠️ Status check failed: {str(e)} (attempt {attempts+1})")
+        else:
+            status = story_data.get("status")
+            
+            if status == "completed":
+                print("✅ Story generation completed!")
+                return story_data
+            elif status == "failed":
+                error_msg = story_data.get("error", "Unknown error")
+                raise Exception(f"Story generation failed: {error_msg}")
+            
+            # Still processing - provide status update
+            current_stage = status.replace("_", " ").title()
+            print(f"🔄 Current status: {current_stage}... (attempt {attempts+1})")
+        
+        # Truncated exponential backoff with jitter, never sleeping past the deadline
+        delay = min(max_interval, polling_interval * 2 ** attempts) * random.uniform(0.5, 1.5)
+        attempts += 1
+        await asyncio.sleep(max(0, min(delay, deadline - time.monotonic())))
+    
+    raise Exception("Timed out waiting for story completion")
+
+async def stream_story_events(session: aiohttp.ClientSession, story_id: str) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Yield progress events for a story from the server-sent event stream
+    """
+    timeout = aiohttp.ClientTimeout(total=None, sock_read=None)
+    async with session.get(f"{BASE_URL}/story/{story_id}/stream", timeout=timeout) as response:
+        response.raise_for_status()
+        async for line in response.content:
+            line = line.decode("utf-8").strip()
+            if line.startswith("data:"):
+                yield orjson.loads(line[len("data:"):].strip())
+
+async def follow_story_stream(session: aiohttp.ClientSession, story_id: str) -> Dict[str, Any]:
+    """
+    Follow story progress over the event stream and fetch the finished story
+    """
+    async for event in stream_story_events(session, story_id):
+        status = event.get("status")
         
         if status == "completed":
             print("✅ Story generation completed!")
-            return story_data
+            return await check_story_status(session, story_id)
         elif status == "failed":
+            story_data = await check_story_status(session, story_id)
             error_msg = story_data.get("error", "Unknown error")
             raise Exception(f"Story generation failed: {error_msg}")
         
-        # Still processing - provide status update
         current_stage = status.replace("_", " ").title()
-        print(f"🔄 Current status: {current_stage}... (attempt {attempts+1}/{max_attempts})")
-        
-        attempts += 1
-        time.sleep(polling_interval)
+        if event.get("total_scenes"):
+            print(f"🔄 Current status: {current_stage}... (scene {event.get('current_scene')}/{event.get('total_scenes')})")
+        else:
+            print(f"🔄 Current status: {current_stage}...")
     
-    raise Exception("Timed out waiting for story completion")
+    raise aiohttp.ClientPayloadError("Event stream closed before story completed")
 
 def save_story_to_file(story_data: Dict[str, Any], output_file: str = None) -> str:
     """
@@ -76,27 +152,17 @@ def save_story_to_file(story_data: Dict[str, Any], output_file: str = None) -> s
         output_file = f"{subject}_{topic}_{grade}_{story_id[:8]}.json"
     
     # Save to file
-    with open(output_file, "w") as f:
-        json.dump(story_data, f, indent=2)
+    with open(output_file, "wb") as f:
+        f.write(orjson.dumps(story_data, option=orjson.OPT_INDENT_2))
     
     return output_file
 
-def main():
-    # Parse command line arguments
-    parser = argparse.ArgumentParser(description="Client for Educational Story Generator API")
-    parser.add_argument("--subject", "-s", required=True, help="Subject for the story (e.g., Mathematics)")
-    parser.add_argument("--topic", "-t", required=True, help="Topic for the story (e.g., Fractions)")
-    parser.add_argument("--grade", "-g", default="grade_6", help="Grade level (e.g., grade_6)")
-    parser.add_argument("--curriculum", "-c", default="General", help="Curriculum to follow (e.g., CBSE)")
-    parser.add_argument("--specific-area", "-a", help="Specific area within the topic (optional)")
-    parser.add_argument("--output", "-o", help="Output file name (optional)")
-    parser.add_argument("--poll-interval", "-i", type=int, default=10, help="Polling interval in seconds")
-    args = parser.parse_args()
-    
-    try:
+async def run(args: argparse.Namespace) -> None:
+    async with create_session() as session:
         # Step 1: Request story generation
         print(f"🚀 Requesting story generation for {args.subject} - {args.topic} (Grade: {args.grade})")
-        initial_data = generate_story(
+        initial_data = await generate_story(
+            session,
             args.subject, 
             args.topic,
             args.grade,
@@ -106,25 +172,90 @@ def main():
         story_id = initial_data["story_id"]
         print(f"📝 Story generation started with ID: {story_id}")
         
-        # Step 2: Wait for completion
+        # Step 2: Wait for completion, preferring the event stream over polling
         print("⏳ Waiting for story generation to complete...")
-        complete_story = wait_for_story_completion(
-            story_id,
-            polling_interval=args.poll_interval
+        deadline = time.monotonic() + args.max_wait
+        try:
+            complete_story = await asyncio.wait_for(follow_story_stream(session, story_id), timeout=args.max_wait)
+        except asyncio.TimeoutError:
+            raise Exception("Timed out waiting for story completion")
+        except aiohttp.ClientError as e:
+            # The fallback only gets whatever is left of the overall --max-wait budget
+            print(f"⚠️ Event stream unavailable ({str(e)}), falling back to polling")
+            complete_story = await wait_for_story_completion(
+                session,
+                story_id,
+                polling_interval=args.poll_interval,
+                max_interval=args.max_poll_interval,
+                max_wait=max(0, deadline - time.monotonic())
+            )
+    
+    # Step 3: Save to file
+    output_file = save_story_to_file(complete_story, args.output)
+    print(f"💾 Story saved to: {output_file}")
+    
+    # Print summary
+    print("\n📖 Story Summary:")
+    print(f"Title: {args.subject}: {args.topic}")
+    if args.specific_area:
+        print(f"Specific Area: {args.specific_area}")
+    print(f"Number of scenes: {len(complete_story.get('scenes', []))}")
+
+async def wait_for_stories(story_ids: List[str], polling_interval: float = 2, max_interval: float = 60, max_wait: float = 1800) -> List[Any]:
+    """
+    Track several story generations concurrently over one shared session.
+    Returns one entry per story ID: the completed story, or the exception it failed with.
+    """
+    async with create_session() as session:
+        return await asyncio.gather(
+            *[
+                wait_for_story_completion(session, story_id, polling_interval, max_interval, max_wait)
+                for story_id in story_ids
+            ],
+            return_exceptions=True
         )
-        
-        # Step 3: Save to file
-        output_file = save_story_to_file(complete_story, args.output)
-        print(f"💾 Story saved to: {output_file}")
-        
-        # Print summary
-        print("\n📖 Story Summary:")
-        print(f"Title: {args.subject}: {args.topic}")
-        if args.specific_area:
-            print(f"Specific Area: {args.specific_area}")
-        print(f"Number of scenes: {len(complete_story.get('scenes', []))}")
-        
-    except requests.exceptions.RequestException as e:
+
+async def track_existing_stories(args: argparse.Namespace) -> None:
+    print(f"⏳ Tracking {len(args.story_id)} stories...")
+    results = await wait_for_stories(
+        args.story_id,
+        polling_interval=args.poll_interval,
+        max_interval=args.max_poll_interval,
+        max_wait=args.max_wait
+    )
+    
+    for story_id, result in zip(args.story_id, results):
+        if isinstance(result, Exception):
+            print(f"❌ {story_id}: {str(result)}")
+        else:
+            # A custom output name only makes sense for a single story
+            output_file = save_story_to_file(result, args.output if len(args.story_id) == 1 else None)
+            print(f"💾 {story_id}: saved to {output_file} ({len(result.get('scenes', []))} scenes)")
+
+def main():
+    # Parse command line arguments
+    parser = argparse.ArgumentParser(description="Client for Educational Story Generator API")
+    parser.add_argument("--subject", "-s", help="Subject for the story (e.g., Mathematics)")
+    parser.add_argument("--topic", "-t", help="Topic for the story (e.g., Fractions)")
+    parser.add_argument("--grade", "-g", default="grade_6", help="Grade level (e.g., grade_6)")
+    parser.add_argument("--curriculum", "-c", default="General", help="Curriculum to follow (e.g., CBSE)")
+    parser.add_argument("--specific-area", "-a", help="Specific area within the topic (optional)")
+    parser.add_argument("--output", "-o", help="Output file name (optional)")
+    parser.add_argument("--poll-interval", "-i", type=float, default=2, help="Initial polling interval in seconds (doubles on each check)")
+    parser.add_argument("--max-poll-interval", type=float, default=60, help="Maximum polling interval in seconds")
+    parser.add_argument("--max-wait", type=float, default=1800, help="Maximum total time to wait for the story in seconds")
+    parser.add_argument("--story-id", action="append", help="Track an already started story instead of generating one (repeatable)")
+    args = parser.parse_args()
+    
+    if not args.story_id and not (args.subject and args.topic):
+        parser.error("--subject and --topic are required unless --story-id is given")
+    
+    try:
+        if args.story_id:
+            asyncio.run(track_existing_stories(args))
+        else:
+            asyncio.run(run(args))
+    except aiohttp.ClientError as e:
         print(f"❌ API request error: {str(e)}")
     except Exception as e:
         print(f"❌ Error: {str(e)}")
@@ -15,7 +15,7 @@ load_dotenv()
 
 # Initialize story generator and knowledge base seeder
 story_generator = StoryGenerator()
-knowledge_seeder = KnowledgeBaseSeeder()
+knowledge_seeder = KnowledgeBaseSeeder(story_generator.vector_store)
 
 # Set page config
 st.set_page_config(
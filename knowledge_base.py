@@ -1,5 +1,5 @@
 import os
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from dotenv import load_dotenv
 import openai
 from vector_store import VectorStore
@@ -8,8 +8,10 @@ load_dotenv()
 openai.api_key = os.getenv("OPENAI_API_KEY")
 
 class KnowledgeBaseSeeder:
-    def __init__(self):
-        self.vector_store = VectorStore()
+    def __init__(self, vector_store: Optional[VectorStore] = None):
+        # Share the generator's store when given, so seeding and retrieval hit the same collection and encoder
+        self.vector_store = vector_store or VectorStore()
+        self._async_client = None
         self.llm_model = "gpt-4o"
         
         # Detailed grade level guidelines for knowledge complexity for each individual grade
@@ -153,8 +155,8 @@ class KnowledgeBaseSeeder:
             }
         }
     
-    def get_knowledge_chunks(self, subject: str, topic: str, grade: str = "grade_6", curriculum: str = "General", num_chunks: int = 10) -> List[str]:
-        """Generate knowledge chunks about the subject and topic appropriate for the grade level and curriculum"""
+    def _knowledge_chunks_request(self, subject: str, topic: str, grade: str, curriculum: str, num_chunks: int) -> Dict[str, Any]:
+        """Build the chat completion arguments for generating knowledge chunks"""
         # Get grade-specific guidelines - use the specified grade level or empty dict if not found
         guidelines = self.grade_guidelines.get(grade, {})
         
@@ -179,17 +181,17 @@ class KnowledgeBaseSeeder:
         Format: Return each chunk as a separate paragraph with a clear focus.
         """
         
-        response = openai.chat.completions.create(
-            model=self.llm_model,
-            messages=[
+        return {
+            "model": self.llm_model,
+            "messages": [
                 {"role": "system", "content": f"You are a knowledgeable educator who can explain complex topics clearly to {grade} level students."},
                 {"role": "user", "content": prompt}
             ],
-            temperature=0.3,
-        )
-        
-        result = response.choices[0].message.content
-        
+            "temperature": 0.3,
+        }
+    
+    @staticmethod
+    def _split_chunks(result: str, num_chunks: int) -> List[str]:
         # Split into chunks - we'll treat paragraphs as separate chunks
         chunks = [chunk.strip() for chunk in result.split("\n\n") if chunk.strip()]
         
@@ -208,15 +210,21 @@ class KnowledgeBaseSeeder:
         
         return chunks[:num_chunks]
     
-    def seed_knowledge_base(self, subject: str, topic: str, grade: str = "grade_6", curriculum: str = "General") -> None:
-        """Seed the knowledge base with information about the subject and topic appropriate for the grade level and curriculum"""
-        print(f"Seeding knowledge base for {subject} on {topic} at {grade} level following {curriculum} curriculum...")
-        
-        # Generate knowledge chunks with the exact grade level provided
-        chunks = self.get_knowledge_chunks(subject, topic, grade, curriculum)
-        
-        # Create metadata for each chunk
-        metadata = [
+    def get_knowledge_chunks(self, subject: str, topic: str, grade: str = "grade_6", curriculum: str = "General", num_chunks: int = 10) -> List[str]:
+        """Generate knowledge chunks about the subject and topic appropriate for the grade level and curriculum"""
+        response = openai.chat.completions.create(**self._knowledge_chunks_request(subject, topic, grade, curriculum, num_chunks))
+        return self._split_chunks(response.choices[0].message.content, num_chunks)
+    
+    async def get_knowledge_chunks_async(self, subject: str, topic: str, grade: str = "grade_6", curriculum: str = "General", num_chunks: int = 10) -> List[str]:
+        """Async version of get_knowledge_chunks that awaits the LLM call instead of blocking a thread"""
+        if self._async_client is None:
+            self._async_client = openai.AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        response = await self._async_client.chat.completions.create(**self._knowledge_chunks_request(subject, topic, grade, curriculum, num_chunks))
+        return self._split_chunks(response.choices[0].message.content, num_chunks)
+    
+    @staticmethod
+    def _chunk_metadata(subject: str, topic: str, grade: str, curriculum: str, num_chunks: int) -> List[Dict[str, Any]]:
+        return [
             {
                 "subject": subject,
                 "topic": topic,
@@ -224,10 +232,26 @@ class KnowledgeBaseSeeder:
                 "curriculum": curriculum,
                 "chunk_index": i
             }
-            for i in range(len(chunks))
+            for i in range(num_chunks)
         ]
+    
+    def seed_knowledge_base(self, subject: str, topic: str, grade: str = "grade_6", curriculum: str = "General") -> None:
+        """Seed the knowledge base with information about the subject and topic appropriate for the grade level and curriculum"""
+        print(f"Seeding knowledge base for {subject} on {topic} at {grade} level following {curriculum} curriculum...")
+        
+        # Generate knowledge chunks with the exact grade level provided
+        chunks = self.get_knowledge_chunks(subject, topic, grade, curriculum)
+        
+        # Add to vector store, waiting until the chunks are searchable since story generation queries them next
+        self.vector_store.add_texts(chunks, self._chunk_metadata(subject, topic, grade, curriculum, len(chunks)), wait=True)
+        
+        print(f"Added {len(chunks)} knowledge chunks to the vector store for {grade} level {curriculum} curriculum.")
+    
+    async def seed_knowledge_base_async(self, subject: str, topic: str, grade: str = "grade_6", curriculum: str = "General") -> None:
+        """Async version of seed_knowledge_base for use directly on the event loop"""
+        print(f"Seeding knowledge base for {subject} on {topic} at {grade} level following {curriculum} curriculum...")
         
-        # Add to vector store
-        self.vector_store.add_texts(chunks, metadata)
+        chunks = await self.get_knowledge_chunks_async(subject, topic, grade, curriculum)
+        await self.vector_store.add_texts_async(chunks, self._chunk_metadata(subject, topic, grade, curriculum, len(chunks)), wait=True)
         
-        print(f"Added {len(chunks)} knowledge chunks to the vector store for {grade} level {curriculum} curriculum.") 
\ No newline at end of file
+        print(f"Added {len(chunks)} knowledge chunks to the vector store for {grade} level {curriculum} curriculum.")
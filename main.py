@@ -1,28 +1,66 @@
 from fastapi import FastAPI, HTTPException, BackgroundTasks, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
+from sse_starlette.sse import EventSourceResponse
 from pydantic import BaseModel, Field
 from typing import List, Dict, Any, Optional
 import os
+import sys
+import asyncio
 from dotenv import load_dotenv
 import json
+import orjson
+import redis.asyncio as redis
 import uuid
+import hashlib
 from datetime import datetime
 import uvicorn
+from contextlib import asynccontextmanager
 
 # Import story generator components
-from story_generator import StoryGenerator
+from story_generator import StoryGenerator, FALLBACK_IMAGE_URL
 from knowledge_base import KnowledgeBaseSeeder
+from memory_store import InMemoryRedis
+from vector_store import prepare_encoder_model
 
 # Load environment variables
 load_dotenv()
 
+# Story state lives in Redis so any Uvicorn worker can serve status checks and streams.
+# Without REDIS_URL an in-process store is used, which only works with a single worker.
+REDIS_URL = os.getenv("REDIS_URL")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if REDIS_URL:
+        app.state.redis = redis.Redis.from_url(REDIS_URL)
+        try:
+            await app.state.redis.ping()
+        except redis.RedisError as e:
+            raise RuntimeError(f"Cannot connect to Redis at REDIS_URL={REDIS_URL}: {e}") from e
+    else:
+        print("REDIS_URL not set, keeping story state in process memory (single worker only)")
+        if int(os.getenv("WEB_CONCURRENCY", 1)) > 1:
+            print("WARNING: WEB_CONCURRENCY > 1 without REDIS_URL - each worker keeps its own stories, "
+                  "so status checks and streams fail when they land on a different worker")
+        app.state.redis = InMemoryRedis()
+    
+    # Runs in every worker: only load the (already exported) encoder and open the Qdrant
+    # connection, so the first story request doesn't pay for them
+    await asyncio.to_thread(story_generator.vector_store.warmup)
+    
+    yield
+    
+    await app.state.redis.aclose()
+
 # Initialize FastAPI app
 app = FastAPI(
+    lifespan=lifespan,
     title="Story Generator API",
     description="API service for generating educational stories scene-by-scene",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
 # Configure CORS middleware
@@ -36,7 +74,50 @@ app.add_middleware(
 
 # Initialize story generator and knowledge base seeder
 story_generator = StoryGenerator()
-knowledge_base_seeder = KnowledgeBaseSeeder()
+knowledge_base_seeder = KnowledgeBaseSeeder(story_generator.vector_store)
+
+STORY_TTL_SECONDS = 3600
+# DALL-E image URLs expire after about an hour, so cached stories must expire before their images do
+STORY_CACHE_TTL_SECONDS = 50 * 60
+
+def story_key(story_id: str) -> str:
+    return f"story:{story_id}"
+
+def story_channel(story_id: str) -> str:
+    return f"story:{story_id}:events"
+
+def progress_event(story_data: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "story_id": story_data["story_id"],
+        "status": story_data["status"],
+        **story_data.get("progress", {})
+    }
+
+async def save_story(story_data: Dict[str, Any]) -> None:
+    """Persist the story state and notify stream subscribers of the new progress"""
+    story_id = story_data["story_id"]
+    await app.state.redis.set(story_key(story_id), orjson.dumps(story_data), ex=STORY_TTL_SECONDS)
+    await app.state.redis.publish(story_channel(story_id), orjson.dumps(progress_event(story_data)))
+
+async def load_story(story_id: str) -> Optional[Dict[str, Any]]:
+    raw = await app.state.redis.get(story_key(story_id))
+    return orjson.loads(raw) if raw is not None else None
+
+def story_cache_key(subject: str, full_topic: str, grade: str, curriculum: str) -> str:
+    """Content-addressed key for a generated story, so identical requests can reuse it"""
+    digest = hashlib.blake2b(f"{subject}|{full_topic}|{grade}|{curriculum}".encode(), digest_size=16).hexdigest()
+    return f"story:cache:{digest}"
+
+async def load_cached_story(cache_key: str) -> Optional[Dict[str, Any]]:
+    raw = await app.state.redis.get(cache_key)
+    return orjson.loads(raw) if raw is not None else None
+
+async def cache_story(cache_key: str, complete_story: Dict[str, Any]) -> None:
+    await app.state.redis.set(cache_key, orjson.dumps(complete_story), ex=STORY_CACHE_TTL_SECONDS)
+
+def publish_progress(story_data: Dict[str, Any], loop: asyncio.AbstractEventLoop) -> None:
+    """Save story state from a worker thread, waiting until it is written"""
+    asyncio.run_coroutine_threadsafe(save_story(story_data), loop).result()
 
 # Pydantic models for request/response validation
 class StoryRequest(BaseModel):
@@ -63,7 +144,7 @@ class StoryResponse(BaseModel):
 # Custom exception handlers
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=422,
         content={
             "detail": "Invalid request format",
@@ -80,7 +161,7 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
 
 @app.exception_handler(json.JSONDecodeError)
 async def json_decode_exception_handler(request: Request, exc: json.JSONDecodeError):
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=400,
         content={
             "detail": "Invalid JSON format",
@@ -95,79 +176,187 @@ async def json_decode_exception_handler(request: Request, exc: json.JSONDecodeEr
         }
     )
 
-@app.post("/generate-story", response_model=StoryResponse)
-async def generate_story(request: StoryRequest):
+def mark_story_completed(story_data: Dict[str, Any], complete_story: Dict[str, Any]) -> None:
+    """Fill in a story record from a finished generation result"""
+    story_data.update({
+        "status": "completed",
+        "outline": complete_story["outline"],
+        "scenes": complete_story["scenes"],
+        "completed_at": datetime.now().isoformat(),
+        "progress": {
+            "current_scene": len(complete_story["scenes"]),
+            "total_scenes": len(complete_story["scenes"]),
+            "current_stage": "completed"
+        }
+    })
+
+async def run_story_generation(story_data: Dict[str, Any], request: StoryRequest, full_topic: str, cache_key: str) -> None:
+    """Seed the knowledge base and generate the story, recording progress in the shared story store.
+    
+    Seeding is awaited on the event loop; scene generation is blocking (LLM calls) and runs in a worker thread."""
+    loop = asyncio.get_running_loop()
     
     try:
-        # Validate required fields
-        if not request.subject or not request.topic:
-            raise HTTPException(status_code=400, detail="Subject and topic are required")
-        
-        # Create a unique ID for this story request
-        story_id = str(uuid.uuid4())
-        started_at = datetime.now().isoformat()
-        
-        # Create initial story data
-        story_data = {
-            "story_id": story_id,
-            "status": "processing",
-            "subject": request.subject,
-            "topic": request.topic,
-            "grade": request.grade,
-            "curriculum": request.curriculum,
-            "started_at": started_at,
-            "progress": {
-                "current_scene": 0,
-                "total_scenes": 0,
-                "current_stage": "initializing"
-            }
-        }
-        
         # Update status to indicate knowledge base seeding
         story_data["status"] = "seeding_knowledge_base"
         story_data["progress"]["current_stage"] = "seeding_knowledge_base"
+        await save_story(story_data)
         
         # Seed the knowledge base with relevant information
-        full_topic = f"{request.topic} - {request.specific_area}" if request.specific_area else request.topic
-        knowledge_base_seeder.seed_knowledge_base(request.subject, full_topic, request.grade, request.curriculum)
+        await knowledge_base_seeder.seed_knowledge_base_async(request.subject, full_topic, request.grade, request.curriculum)
         
         # Update status to indicate story generation
         story_data["status"] = "generating_story"
         story_data["progress"]["current_stage"] = "generating_story"
+        await save_story(story_data)
+        
+        def on_scene_generated(current_scene: int, total_scenes: int) -> None:
+            story_data["progress"].update({
+                "current_scene": current_scene,
+                "total_scenes": total_scenes
+            })
+            publish_progress(story_data, loop)
         
         # Generate the complete story
-        complete_story = story_generator.generate_complete_story(request.subject, full_topic, request.grade, request.curriculum)
+        complete_story = await asyncio.to_thread(story_generator.generate_complete_story, request.subject, full_topic, request.grade, request.curriculum, on_scene_generated)
         
-        # Update the story data with the complete story
-        story_data.update({
-            "status": "completed",
-            "outline": complete_story["outline"],
-            "scenes": complete_story["scenes"],
-            "completed_at": datetime.now().isoformat(),
-            "progress": {
-                "current_scene": len(complete_story["scenes"]),
-                "total_scenes": len(complete_story["scenes"]),
-                "current_stage": "completed"
-            }
-        })
+        # Remember the result for identical future requests, unless an image failed and
+        # the placeholder would be replayed to every later request
+        if all(scene.get("image_url") != FALLBACK_IMAGE_URL for scene in complete_story["scenes"]):
+            await cache_story(cache_key, complete_story)
         
-        return story_data
+        # Update the story data with the complete story
+        mark_story_completed(story_data, complete_story)
+        await save_story(story_data)
         
     except Exception as e:
         # Handle any errors during story generation
-        return {
-            "story_id": story_id,
+        story_data.update({
             "status": "failed",
-            "subject": request.subject,
-            "topic": request.topic,
-            "grade": request.grade,
-            "curriculum": request.curriculum,
-            "started_at": started_at,
             "error": str(e),
             "progress": {
                 "current_stage": "failed"
             }
+        })
+        await save_story(story_data)
+
+@app.post("/generate-story", response_model=StoryResponse)
+async def generate_story(request: StoryRequest, background_tasks: BackgroundTasks):
+    # Validate required fields
+    if not request.subject or not request.topic:
+        raise HTTPException(status_code=400, detail="Subject and topic are required")
+    
+    # Create a unique ID for this story request
+    story_id = str(uuid.uuid4())
+    started_at = datetime.now().isoformat()
+    
+    # Create initial story data
+    story_data = {
+        "story_id": story_id,
+        "status": "processing",
+        "subject": request.subject,
+        "topic": request.topic,
+        "grade": request.grade,
+        "curriculum": request.curriculum,
+        "started_at": started_at,
+        "progress": {
+            "current_scene": 0,
+            "total_scenes": 0,
+            "current_stage": "initializing"
         }
+    }
+    
+    # Identical requests reuse a previously generated story and skip seeding and generation
+    full_topic = f"{request.topic} - {request.specific_area}" if request.specific_area else request.topic
+    cache_key = story_cache_key(request.subject, full_topic, request.grade, request.curriculum)
+    cached_story = await load_cached_story(cache_key)
+    if cached_story is not None:
+        mark_story_completed(story_data, cached_story)
+        await save_story(story_data)
+        return story_data
+    
+    await save_story(story_data)
+    
+    # Run seeding and generation after the response is sent
+    background_tasks.add_task(run_story_generation, story_data, request, full_topic, cache_key)
+    
+    return story_data
+
+@app.get("/story/{story_id}", response_model=StoryResponse)
+async def get_story(story_id: str):
+    story_data = await load_story(story_id)
+    if story_data is None:
+        raise HTTPException(status_code=404, detail="Story not found")
+    return story_data
+
+@app.get("/story/{story_id}/stream")
+async def stream_story(story_id: str):
+    # Subscribe before reading the snapshot so no update can slip in between
+    pubsub = app.state.redis.pubsub()
+    await pubsub.subscribe(story_channel(story_id))
+    
+    story_data = await load_story(story_id)
+    if story_data is None:
+        await pubsub.aclose()
+        raise HTTPException(status_code=404, detail="Story not found")
+    
+    async def event_generator():
+        try:
+            # Always start with a snapshot so late subscribers see the current state
+            yield {"data": orjson.dumps(progress_event(story_data)).decode()}
+            if story_data["status"] in ("completed", "failed"):
+                return
+            
+            async for message in pubsub.listen():
+                if message["type"] != "message":
+                    continue
+                event = orjson.loads(message["data"])
+                yield {"data": orjson.dumps(event).decode()}
+                if event["status"] in ("completed", "failed"):
+                    return
+        finally:
+            await pubsub.aclose()
+    
+    return EventSourceResponse(event_generator())
+
+@app.get("/generate-story/stream")
+async def stream_generate_story(
+    subject: str,
+    topic: str,
+    grade: str = "grade_6",
+    curriculum: str = "CBSE",
+    specific_area: Optional[str] = None
+):
+    if not subject or not topic:
+        raise HTTPException(status_code=400, detail="Subject and topic are required")
+    
+    full_topic = f"{topic} - {specific_area}" if specific_area else topic
+    
+    async def event_generator():
+        try:
+            yield {"data": orjson.dumps({"type": "stage", "stage": "seeding_knowledge_base"}).decode()}
+            await knowledge_base_seeder.seed_knowledge_base_async(subject, full_topic, grade, curriculum)
+            
+            yield {"data": orjson.dumps({"type": "stage", "stage": "generating_story"}).decode()}
+            async for event in story_generator.stream_scenes(subject, full_topic, grade, curriculum):
+                yield {"data": orjson.dumps(event).decode()}
+            
+            yield {"data": orjson.dumps({"type": "stage", "stage": "completed"}).decode()}
+        except Exception as e:
+            yield {"data": orjson.dumps({"type": "error", "error": str(e)}).decode()}
+    
+    return EventSourceResponse(event_generator())
 
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True) 
\ No newline at end of file
+    # Export the ONNX encoder once in this parent process so the workers don't all race to build it
+    prepare_encoder_model()
+    
+    # uvloop is POSIX-only; fall back to the default asyncio loop on Windows
+    loop = "uvloop" if sys.platform != "win32" else "asyncio"
+    if os.getenv("RELOAD") == "1":
+        # Development mode: auto-reload is incompatible with multiple workers
+        uvicorn.run("main:app", host="0.0.0.0", port=8000, loop=loop, http="httptools", reload=True)
+    else:
+        # Same variable the uvicorn CLI (and so the Dockerfile) reads for its worker count
+        workers = int(os.getenv("WEB_CONCURRENCY", 1))
+        uvicorn.run("main:app", host="0.0.0.0", port=8000, loop=loop, http="httptools", workers=workers) 
\ No newline at end of file
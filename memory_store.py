@@ -0,0 +1,78 @@
+import asyncio
+import heapq
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+
+class InMemoryPubSub:
+    """Subset of redis.asyncio.client.PubSub used by the API, backed by per-subscriber queues"""
+
+    def __init__(self, store: "InMemoryRedis"):
+        self._store = store
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._channels: Set[str] = set()
+
+    async def subscribe(self, channel: str) -> None:
+        self._channels.add(channel)
+        self._store._subscribers.setdefault(channel, set()).add(self._queue)
+
+    async def listen(self) -> AsyncIterator[Dict[str, Any]]:
+        while True:
+            yield await self._queue.get()
+
+    async def aclose(self) -> None:
+        for channel in self._channels:
+            subscribers = self._store._subscribers.get(channel)
+            if subscribers is not None:
+                subscribers.discard(self._queue)
+                if not subscribers:
+                    del self._store._subscribers[channel]
+        self._channels.clear()
+
+class InMemoryRedis:
+    """Single-process stand-in for the redis.asyncio client calls the API makes (get/set with TTL, publish, pubsub).
+
+    State is not shared between Uvicorn workers, so it is only suitable for a single worker."""
+
+    def __init__(self):
+        self._data: Dict[str, Tuple[bytes, Optional[float]]] = {}
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        # (expires_at, key) min-heap so expired keys are dropped even if nobody reads them again
+        self._expiry_heap: List[Tuple[float, str]] = []
+
+    def _purge_expired(self) -> None:
+        now = time.monotonic()
+        while self._expiry_heap and self._expiry_heap[0][0] <= now:
+            expires_at, key = heapq.heappop(self._expiry_heap)
+            entry = self._data.get(key)
+            # Skip stale heap entries for keys that were rewritten with a later expiry
+            if entry is not None and entry[1] == expires_at:
+                del self._data[key]
+
+    async def set(self, key: str, value: bytes, ex: Optional[float] = None) -> None:
+        self._purge_expired()
+        expires_at = time.monotonic() + ex if ex else None
+        self._data[key] = (value, expires_at)
+        if expires_at is not None:
+            heapq.heappush(self._expiry_heap, (expires_at, key))
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and time.monotonic() >= expires_at:
+            del self._data[key]
+            return None
+        return value
+
+    async def publish(self, channel: str, message: bytes) -> int:
+        subscribers = self._subscribers.get(channel, set())
+        for queue in subscribers:
+            queue.put_nowait({"type": "message", "channel": channel, "data": message})
+        return len(subscribers)
+
+    def pubsub(self) -> InMemoryPubSub:
+        return InMemoryPubSub(self)
+
+    async def aclose(self) -> None:
+        self._subscribers.clear()
@@ -0,0 +1,91 @@
+import os
+import shutil
+import tempfile
+from typing import List, Union
+import numpy as np
+import onnxruntime
+from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+from optimum.onnxruntime.configuration import AutoQuantizationConfig
+from transformers import AutoTokenizer
+
+QUANTIZED_FILE_NAME = "model_quantized.onnx"
+DEFAULT_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+DEFAULT_MODEL_DIR = "./minilm-onnx"
+
+def export_quantized_model(model_name: str = DEFAULT_MODEL_NAME, model_dir: str = DEFAULT_MODEL_DIR) -> None:
+    """Export and int8-quantize the model into model_dir unless it is already there.
+
+    The model is built in a temporary sibling directory and renamed into place, so processes
+    starting at the same time never load a half-written model."""
+    if os.path.exists(os.path.join(model_dir, QUANTIZED_FILE_NAME)):
+        return
+
+    parent_dir = os.path.dirname(os.path.abspath(model_dir))
+    os.makedirs(parent_dir, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix=".minilm-onnx-", dir=parent_dir)
+    try:
+        model = ORTModelForFeatureExtraction.from_pretrained(model_name, export=True)
+        model.save_pretrained(tmp_dir)
+        AutoTokenizer.from_pretrained(model_name).save_pretrained(tmp_dir)
+
+        quantizer = ORTQuantizer.from_pretrained(tmp_dir)
+        qconfig = AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=False)
+        quantizer.quantize(save_dir=tmp_dir, quantization_config=qconfig)
+
+        os.replace(tmp_dir, model_dir)
+    except OSError:
+        # Another process won the race and model_dir is already populated
+        if not os.path.exists(os.path.join(model_dir, QUANTIZED_FILE_NAME)):
+            raise
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+class OnnxSentenceEncoder:
+    """Drop-in replacement for SentenceTransformer.encode backed by a dynamically int8-quantized ONNX model"""
+
+    def __init__(self, model_name: str = DEFAULT_MODEL_NAME, model_dir: str = DEFAULT_MODEL_DIR):
+        # Export and quantize once; later runs (and the Docker image) load the cached quantized model
+        export_quantized_model(model_name, model_dir)
+
+        session_options = onnxruntime.SessionOptions()
+        # One thread per session by default: each Uvicorn worker has its own session, so
+        # parallelism comes from the workers; raise ORT_NUM_THREADS when running fewer workers than cores
+        session_options.intra_op_num_threads = int(os.getenv("ORT_NUM_THREADS", 1))
+
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.model = ORTModelForFeatureExtraction.from_pretrained(
+            model_dir,
+            file_name=QUANTIZED_FILE_NAME,
+            provider="CPUExecutionProvider",
+            session_options=session_options
+        )
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.model.config.hidden_size
+
+    def encode(self, sentences: Union[str, List[str]], batch_size: int = 32, convert_to_numpy: bool = True, normalize_embeddings: bool = False) -> np.ndarray:
+        single = isinstance(sentences, str)
+        if single:
+            sentences = [sentences]
+
+        embeddings = []
+        for start in range(0, len(sentences), batch_size):
+            batch = sentences[start:start + batch_size]
+            inputs = self.tokenizer(batch, padding=True, truncation=True, max_length=256, return_tensors="np")
+            hidden = self.model(**inputs).last_hidden_state
+
+            # Mean-pool over real tokens only; the batched matmul sums masked tokens in one
+            # BLAS call instead of materializing a (batch, tokens, hidden) masked copy
+            mask = inputs["attention_mask"].astype(hidden.dtype)
+            pooled = np.matmul(mask[:, None, :], hidden)[:, 0, :] / np.clip(mask.sum(axis=1, keepdims=True), 1e-9, None)
+
+            if normalize_embeddings:
+                pooled = pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            embeddings.append(pooled.astype(np.float32))
+
+        result = np.concatenate(embeddings) if embeddings else np.zeros((0, self.get_sentence_embedding_dimension()), dtype=np.float32)
+        return result[0] if single else result
+
+if __name__ == "__main__":
+    # Build the quantized model ahead of time (used by the Dockerfile)
+    export_quantized_model(model_dir=os.getenv("ONNX_MODEL_DIR", DEFAULT_MODEL_DIR))
@@ -1,5 +1,6 @@
 import os
-from typing import List, Dict, Any, Optional
+import asyncio
+from typing import List, Dict, Any, Optional, Callable, Iterator, AsyncIterator
 from dotenv import load_dotenv
 import openai
 from vector_store import VectorStore
@@ -10,6 +11,9 @@ from vector_store import VectorStore
 load_dotenv()
 openai.api_key = os.getenv("OPENAI_API_KEY")
 
+# Placeholder returned when image generation fails
+FALLBACK_IMAGE_URL = "https://placehold.co/1024x1024/3498db/FFFFFF?text=Image+Generation+Failed"
+
 class StoryGenerator:
     def __init__(self):
         self.vector_store = VectorStore()
@@ -407,14 +411,14 @@ class StoryGenerator:
         except Exception as e:
             print(f"Error generating image: {e}")
             # Provide a fallback URL to a placeholder image
-            fallback_url = "https://placehold.co/1024x1024/3498db/FFFFFF?text=Image+Generation+Failed"
-            print(f"Using fallback image: {fallback_url}")
-            return fallback_url
+            print(f"Using fallback image: {FALLBACK_IMAGE_URL}")
+            return FALLBACK_IMAGE_URL
     
-    def generate_complete_story(self, subject: str, topic: str, grade: str = "grade_6", curriculum: str = "General") -> Dict[str, Any]:
-        """Generate a complete story with multiple scenes, each with narrative, explanation, and image appropriate for the grade level and curriculum"""
+    def iter_story(self, subject: str, topic: str, grade: str = "grade_6", curriculum: str = "General") -> Iterator[Dict[str, Any]]:
+        """Generate a story incrementally, yielding an outline event followed by one event per finished scene"""
         # Generate the story outline
         outline = self.generate_story_outline(subject, topic, grade, curriculum)
+        yield {"type": "outline", "outline": outline}
         
         # Parse outline to extract scenes
         scenes_descriptions = []
@@ -456,6 +460,33 @@ class StoryGenerator:
             
             scenes.append(scene)
             print(f"Generated scene {i+1}/{total_scenes} ✓")
+            
+            yield {"type": "scene", "scene_number": i + 1, "total_scenes": total_scenes, "scene": scene}
+    
+    async def stream_scenes(self, subject: str, topic: str, grade: str = "grade_6", curriculum: str = "General") -> AsyncIterator[Dict[str, Any]]:
+        """Async version of iter_story; each blocking generation step runs in a worker thread"""
+        events = self.iter_story(subject, topic, grade, curriculum)
+        done = object()
+        while True:
+            event = await asyncio.to_thread(next, events, done)
+            if event is done:
+                return
+            yield event
+    
+    def generate_complete_story(self, subject: str, topic: str, grade: str = "grade_6", curriculum: str = "General", progress_callback: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
+        """Generate a complete story with multiple scenes, each with narrative, explanation, and image appropriate for the grade level and curriculum.
+        
+        If progress_callback is given it is called as progress_callback(scenes_done, total_scenes) after each scene."""
+        outline = ""
+        scenes = []
+        
+        for event in self.iter_story(subject, topic, grade, curriculum):
+            if event["type"] == "outline":
+                outline = event["outline"]
+            else:
+                scenes.append(event["scene"])
+                if progress_callback:
+                    progress_callback(event["scene_number"], event["total_scenes"])
         
         return {
             "subject": subject,
@@ -1,17 +1,44 @@
 import os
-from typing import List, Dict, Any, Optional
+import uuid
+import asyncio
+from typing import List, Dict, Any, Optional, Tuple
+from functools import lru_cache
 from dotenv import load_dotenv
-from qdrant_client import QdrantClient
+from qdrant_client import QdrantClient, AsyncQdrantClient
 from qdrant_client.http import models
 from sentence_transformers import SentenceTransformer
 
 load_dotenv()
 
+# Embedding size of all-MiniLM-L6-v2
+EMBED_DIM = 384
+
+# Search the quantized vectors, then rescore the top hits against the full vectors
+SEARCH_PARAMS = models.SearchParams(quantization=models.QuantizationSearchParams(rescore=True))
+
+# Points per upsert request when ingesting asynchronously
+UPSERT_CHUNK_SIZE = 256
+
+def prepare_encoder_model() -> None:
+    """Build the quantized ONNX model ahead of time, once, before any worker processes start.
+
+    Workers then only load it; if it is still missing they fall back to building it themselves."""
+    if os.getenv("EMBEDDING_BACKEND", "onnx") != "onnx":
+        return
+    try:
+        from onnx_encoder import export_quantized_model
+        export_quantized_model(model_dir=os.getenv("ONNX_MODEL_DIR", "./minilm-onnx"))
+    except Exception as e:
+        print(f"Error preparing ONNX encoder model: {e}")
+
 class VectorStore:
     def __init__(self, collection_name: str = "story_knowledge_base"):
         self.collection_name = collection_name
         self._encoder = None
 
+        # Cache query embeddings so repeated searches skip the transformer forward pass
+        self._encode_query = lru_cache(maxsize=1024)(self._encode_query_uncached)
+
         # ✅ Remove proxy environment variables (Railway injects them)
         os.environ.pop("HTTP_PROXY", None)
         os.environ.pop("HTTPS_PROXY", None)
@@ -20,12 +47,21 @@ class VectorStore:
         self.qdrant_url = os.getenv("QDRANT_URL")
         self.qdrant_api_key = os.getenv("QDRANT_API_KEY")
 
-        if self.qdrant_url and self.qdrant_api_key:
-            self.client = QdrantClient(url=self.qdrant_url, api_key=self.qdrant_api_key)
-        elif self.qdrant_url:
-            self.client = QdrantClient(url=self.qdrant_url)
+        if self.qdrant_url:
+            # gRPC transport avoids JSON encoding of the float vectors on every upsert/search
+            client_kwargs = {
+                "url": self.qdrant_url,
+                "api_key": self.qdrant_api_key or None,
+                "prefer_grpc": True,
+                "grpc_port": int(os.getenv("QDRANT_GRPC_PORT", 6334)),
+                "timeout": 30
+            }
+            self.client = QdrantClient(**client_kwargs)
+            self.aclient = AsyncQdrantClient(**client_kwargs)
         else:
             self.client = QdrantClient(":memory:")
+            # A second in-memory client would be a separate database, so async calls go through self.client
+            self.aclient = None
 
         # Create collection
         self._create_collection()
@@ -33,26 +69,87 @@ class VectorStore:
     @property
     def encoder(self):
         if self._encoder is None:
-            self._encoder = SentenceTransformer("all-MiniLM-L6-v2")
+            # Prefer the int8-quantized ONNX Runtime encoder; fall back to PyTorch if unavailable
+            if os.getenv("EMBEDDING_BACKEND", "onnx") == "onnx":
+                try:
+                    from onnx_encoder import OnnxSentenceEncoder
+                    self._encoder = OnnxSentenceEncoder(model_dir=os.getenv("ONNX_MODEL_DIR", "./minilm-onnx"))
+                except Exception as e:
+                    print(f"ONNX encoder unavailable, falling back to SentenceTransformer: {e}")
+            if self._encoder is None:
+                self._encoder = SentenceTransformer("all-MiniLM-L6-v2")
         return self._encoder
 
-    def _create_collection(self):
+    def warmup(self) -> None:
+        """Load the encoder (ONNX session or PyTorch model) and open the Qdrant connection ahead of the first request"""
         try:
-            collections = self.client.get_collections().collections
-            names = [c.name for c in collections]
+            self.encoder.encode(["warmup"])
+            self.client.get_collections()
+        except Exception as e:
+            print(f"Error warming up vector store: {e}")
+
+    def _encode_query_uncached(self, query: str) -> Tuple[float, ...]:
+        return tuple(self.encoder.encode(query, normalize_embeddings=True).tolist())
 
-            if self.collection_name not in names:
+    def _create_collection(self):
+        try:
+            # Checking existence first avoids loading the encoder when the collection is already there
+            if not self.client.collection_exists(self.collection_name):
+                # Vectors are L2-normalized at encode time, so dot product equals cosine;
+                # store them as fp16 with an int8 scalar-quantized copy kept in RAM for search
                 self.client.create_collection(
                     collection_name=self.collection_name,
                     vectors_config=models.VectorParams(
-                        size=self.encoder.get_sentence_embedding_dimension(),
-                        distance=models.Distance.COSINE
+                        size=EMBED_DIM,
+                        distance=models.Distance.DOT,
+                        datatype=models.Datatype.FLOAT16
+                    ),
+                    quantization_config=models.ScalarQuantization(
+                        scalar=models.ScalarQuantizationConfig(
+                            type=models.ScalarType.INT8,
+                            always_ram=True
+                        )
                     )
                 )
         except Exception as e:
             print(f"Error creating collection: {e}")
 
-    def add_texts(self, texts: List[str], metadata: Optional[List[Dict[str, Any]]] = None):
+    def _build_points(self, texts: List[str], metadata: List[Dict[str, Any]]) -> List[models.PointStruct]:
+        # Drop repeated texts within the batch so each is encoded only once
+        unique = {}
+        for text, meta in zip(texts, metadata):
+            unique.setdefault(text, meta)
+        texts, metadata = list(unique.keys()), list(unique.values())
+
+        vectors = self.encoder.encode(
+            texts, batch_size=64, convert_to_numpy=True, normalize_embeddings=True
+        ).tolist()
+
+        # Content-addressed IDs: generated locally (no round-trips to Qdrant), and
+        # re-adding the same text overwrites its point instead of duplicating it
+        return [
+            models.PointStruct(
+                id=str(uuid.uuid5(uuid.NAMESPACE_URL, text)),
+                vector=vector,
+                payload={"text": text, **(meta or {})}
+            )
+            for vector, text, meta in zip(vectors, texts, metadata)
+        ]
+
+    @staticmethod
+    def _format_results(results) -> List[Dict[str, Any]]:
+        return [
+            {
+                "text": result.payload.get("text", ""),
+                "score": result.score,
+                **{k: v for k, v in result.payload.items() if k != "text"}
+            }
+            for result in results
+        ]
+
+    def add_texts(self, texts: List[str], metadata: Optional[List[Dict[str, Any]]] = None, wait: bool = False):
+        """Embed and upsert texts. Pass wait=True when the texts must be searchable as soon as this returns;
+        the default wait=False suits bulk ingest that nothing reads right away."""
         if not texts:
             return
 
@@ -60,44 +157,45 @@ class VectorStore:
             metadata = [{}] * len(texts)
 
         try:
-            vectors = self.encoder.encode(texts).tolist()
-            points = []
-
-            for i, (vector, text, meta) in enumerate(zip(vectors, texts, metadata)):
-                point_id = i + len(self.client.scroll(
-                    collection_name=self.collection_name, 
-                    limit=1
-                )[0])
-
-                points.append(
-                    models.PointStruct(
-                        id=point_id,
-                        vector=vector,
-                        payload={"text": text, **(meta or {})}
-                    )
-                )
-
+            points = self._build_points(texts, metadata)
             if points:
-                self.client.upsert(collection_name=self.collection_name, points=points)
+                self.client.upsert(collection_name=self.collection_name, points=points, wait=wait)
+        except Exception as e:
+            print(f"Error adding texts: {e}")
+
+    async def add_texts_async(self, texts: List[str], metadata: Optional[List[Dict[str, Any]]] = None, wait: bool = False):
+        if self.aclient is None:
+            return await asyncio.to_thread(self.add_texts, texts, metadata, wait)
+
+        if not texts:
+            return
+
+        if metadata is None:
+            metadata = [{}] * len(texts)
+
+        try:
+            # Encoding is CPU-bound, keep it off the event loop
+            points = await asyncio.to_thread(self._build_points, texts, metadata)
+
+            # Fire chunked upserts concurrently so client round-trips overlap with server-side indexing
+            chunks = [points[i:i + UPSERT_CHUNK_SIZE] for i in range(0, len(points), UPSERT_CHUNK_SIZE)]
+            await asyncio.gather(*[
+                self.aclient.upsert(collection_name=self.collection_name, points=chunk, wait=wait)
+                for chunk in chunks
+            ])
         except Exception as e:
             print(f"Error adding texts: {e}")
 
     def search(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
         try:
-            query_vector = self.encoder.encode(query).tolist()
+            query_vector = list(self._encode_query(query))
             results = self.client.search(
                 collection_name=self.collection_name,
                 query_vector=query_vector,
-                limit=limit
+                limit=limit,
+                search_params=SEARCH_PARAMS
             )
-            return [
-                {
-                    "text": result.payload.get("text", ""),
-                    "score": result.score,
-                    **{k: v for k, v in result.payload.items() if k != "text"}
-                }
-                for result in results
-            ]
+            return self._format_results(results)
         except Exception as e:
             print(f"Error searching vector store: {e}")
             return []